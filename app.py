@@ -1,28 +1,92 @@
 import asyncio
 import base64
 import functools
+import hashlib
+import hmac
+import importlib
+import json
+import logging
 import os
+import re
+import shutil
+import sys
 import tempfile
+import threading
+import uuid
+import zipfile
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from time import monotonic
+from urllib.parse import quote, unquote
 
-import aiofiles
-import aiohttp
-import numpy as np
-import pandas as pd
 import uvicorn
 from dotenv import find_dotenv, load_dotenv
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from openpyxl import load_workbook
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 load_dotenv(find_dotenv())
-app = FastAPI()
+logger = logging.getLogger(__name__)
+state = {
+    "session": None,
+    "graph_api_headers": None,
+    "graph_api_headers_expiry": 0.0,
+    "warm": False,
+}
+warmup_steps = [
+    step.strip()
+    for step in os.environ.get("WARMUP", "imports,token,pool,workbooks").split(",")
+    if step.strip()
+]
+warmup_retry_seconds = float(os.environ.get("WARMUP_RETRY_SECONDS", "30"))
+graph_token_ttl = float(os.environ.get("GRAPH_TOKEN_TTL", "3000"))
+
+
+async def warmup():
+    while True:
+        try:
+            if "imports" in warmup_steps:
+                for module in ["numpy", "pandas", "openpyxl", "aiofiles", "aiohttp"]:
+                    await asyncio.get_event_loop().run_in_executor(
+                        None, importlib.import_module, module
+                    )
+            if {"pool", "token", "workbooks"} & set(warmup_steps):
+                session = await get_session()
+            if {"token", "workbooks"} & set(warmup_steps):
+                graph_api_headers = await get_graph_api_headers(session)
+            if "workbooks" in warmup_steps:
+                _, downloaded_files = await download_files(
+                    session, graph_api_headers, month_count=1
+                )
+                save_downloaded_files_to_file(downloaded_files)
+            state["warm"] = True
+            return
+        except Exception:
+            logger.exception(
+                "Warmup failed, retrying in %s seconds", warmup_retry_seconds
+            )
+            await asyncio.sleep(warmup_retry_seconds)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    warmup_task = asyncio.create_task(warmup())
+    yield
+    warmup_task.cancel()
+    if state["session"] is not None:
+        await state["session"].close()
+
+
+app = FastAPI(lifespan=lifespan)
 id, origins = "", [
     "http://localhost:3000",
-    os.environ["ORIGIN_0"],
-    os.environ["ORIGIN_1"],
-    os.environ["ORIGIN_2"],
+    *(
+        origin
+        for key in ["ORIGIN_0", "ORIGIN_1", "ORIGIN_2"]
+        if (origin := os.environ.get(key))
+    ),
 ]
 app.add_middleware(
     CORSMiddleware,
@@ -30,9 +94,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    expose_headers=["*", "X-Load-Version", "X-Profile-Name"],
 )
 downloaded_files_path = "/tmp/downloaded_files.txt"
+downloaded_workbooks_path = "/tmp/workbooks"
+downloaded_workbooks_ttl = float(os.environ.get("DOWNLOADED_WORKBOOKS_TTL", "86400"))
+persisted_values_path = "/tmp/persisted_values.json"
+load_versions_path = "/tmp/load_versions"
+load_versions_limit = int(os.environ.get("LOAD_VERSIONS_LIMIT", "8"))
+update_debounce_seconds = float(os.environ.get("UPDATE_DEBOUNCE_SECONDS", "2"))
+update_queues, update_locks = {}, {}
+write_workbook_attempts = int(os.environ.get("WRITE_WORKBOOK_ATTEMPTS", "3"))
+drive_item_cache_ttl = float(os.environ.get("DRIVE_ITEM_CACHE_TTL", "300"))
+drive_item_cache = {}
+history_path = os.environ.get("HISTORY_PATH", "/home/approval_history")
+profiles_path = "/tmp/profiles"
+profiles_limit = int(os.environ.get("PROFILES_LIMIT", "20"))
+profile_interval = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+# Columns written by /update per sheet as [time, approval, id, time, remark],
+# the first matching (file_index, sheet_pattern) wins.
+write_specs = [
+    (0, "cyberark", [5, 6, 9, 10, 8]),
+    (1, "cylance", [12, 13, 16, 17, 15]),
+    (1, "pki", [13, 14, 17, 18, 16]),
+    (2, "go desktop 365-sccm", [17, 18, 21, 22, 20]),
+    (2, "go office 365 additional groups", [4, 2, 6, 7, 5]),
+    (2, "go office", [11, 12, 15, 16, 14]),
+    (3, "internal ad acc", [24, 25, 28, 29, 27]),
+    (3, "doi ad acc", [20, 22, 25, 26, 24]),
+    (3, "workgroup local acc", [16, 18, 21, 22, 20]),
+    (3, "service ad acc", [20, 22, 25, 26, 27]),
+    (3, "dojvic  ad acc", [19, 21, 24, 25, 26]),
+    (3, "perimeter ad acc", [19, 21, 24, 25, 26]),
+    (3, "ca local acc", [13, 15, 18, 19, 17]),
+    (3, "ca ad acc", [20, 22, 25, 26, 24]),
+    (4, "internal local acc", [15, 16, 19, 20, 18]),
+    (4, "internal ad acc", [26, 27, 30, 31, 29]),
+    (4, "doi ad acc", [19, 21, 24, 25, 23]),
+    (4, "doi local acc", [14, 16, 19, 20, 18]),
+    (4, "workgroup local acc", [16, 18, 21, 22, 20]),
+    (4, "service ad acc", [19, 21, 24, 25, 23]),
+    (4, "mgt local acc", [13, 15, 18, 19, 17]),
+    (4, "mgt ad acc", [19, 21, 24, 25, 23]),
+    (4, "dojvic ad acc", [19, 21, 24, 25, 23]),
+    (4, "perimeter ad acc", [19, 21, 24, 25, 23]),
+    (5, "internal ad acc", [24, 25, 28, 29, 27]),
+    (5, "workgroup local acc", [16, 18, 21, 22, 20]),
+    (5, "service local acc", [14, 16, 19, 20, 18]),
+    (5, "service ad acc", [20, 22, 25, 26, 27]),
+    (5, "mgt local acc", [13, 15, 18, 19, 17]),
+    (5, "mgt ad acc", [19, 21, 24, 25, 26]),
+]
+# Low-cardinality /load columns, mapped to whether their shared dictionary is
+# sorted so that sorting on them compares integer codes.
+categorical_columns = {
+    "Filename": False,
+    "Sheetname": True,
+    "Group": True,
+    "Approval": True,
+    "LastApproval": False,
+}
 patterns = [
     ["CyberArk%20and%20DigiCert", "SOC"],
     ["Security%20Tools", "SOC"],
@@ -41,6 +162,218 @@ patterns = [
     ["Windows", "3402 - Windows Privileged User Access"],
     ["Windows", "3150 - Windows Privileged User Access"],
 ]
+sheet_specs = [
+    # Month UAR - SOC 2 - CyberArk Privileged Users Confirmation (CyberArk)
+    (
+        0,
+        "cyberark",
+        [5, 0, 1, 2, 3, 4, 7, 9],
+        False,
+    ),
+    # Month - SOC 2 - Security Tools Privileged User Access Confirmation (Cylance)
+    (
+        1,
+        "cylance",
+        [12, 0, 5, 10, 3, 4, 14, 16],
+        False,
+    ),
+    # Month - SOC 2 - Security Tools Privileged User Access Confirmation (PKI Server Review)
+    (
+        1,
+        "pki",
+        [13, 0, 1, 3, 4, 5, 15, 17],
+        False,
+    ),
+    # Month - UAR-SOC 2 Services - Access Confirmation (GO Desktop 365-SCCM)
+    (
+        2,
+        "go desktop 365-sccm",
+        [17, 0, 1, 4, 5, 8, 19, 21],
+        False,
+    ),
+    # Month - UAR-SOC 2 Services - Access Confirmation (Go Office 365 additional groups)
+    (
+        2,
+        "go office 365 additional groups",
+        [4, 0, 1, 2, 2, 2, 3, 6],
+        True,
+    ),
+    # Month - UAR-SOC 2 Services - Access Confirmation (Go Office 365)
+    (
+        2,
+        "go office",
+        [11, 0, 1, 3, 2, 2, 13, 15],
+        True,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
+    (
+        3,
+        "internal ad acc",
+        [24, 0, 3, 5, 6, 7, 26, 28],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP- DOI  AD)
+    (
+        3,
+        "doi ad acc",
+        [22, 0, 3, 5, 6, 7, 23, 25],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
+    (
+        3,
+        "workgroup local acc",
+        [18, 0, 5, 7, 8, 8, 19, 21],
+        True,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
+    (
+        3,
+        "service ad acc",
+        [22, 0, 3, 5, 6, 7, 23, 28],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (DJCS DOJVIC AD)
+    (
+        3,
+        "dojvic  ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 27],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (PERIMETER AD)
+    (
+        3,
+        "perimeter ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 27],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (CA Local)
+    (
+        3,
+        "ca local acc",
+        [15, 0, 5, 6, 2, 7, 16, 18],
+        False,
+    ),
+    # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (CA AD)
+    (
+        3,
+        "ca ad acc",
+        [22, 0, 3, 5, 6, 7, 23, 25],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP-INTERNAL  Local)
+    (
+        4,
+        "internal local acc",
+        [15, 0, 5, 6, 7, 7, 17, 19],
+        True,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
+    (
+        4,
+        "internal ad acc",
+        [26, 0, 3, 5, 6, 7, 28, 30],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- DOI  AD)
+    (
+        4,
+        "doi ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 24],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- DOI  Local)
+    (
+        4,
+        "doi local acc",
+        [16, 0, 5, 6, 7, 7, 17, 19],
+        True,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
+    (
+        4,
+        "workgroup local acc",
+        [18, 0, 5, 7, 8, 8, 19, 21],
+        True,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
+    (
+        4,
+        "service ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 24],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS MGT Local)
+    (
+        4,
+        "mgt local acc",
+        [15, 0, 5, 6, 4, 7, 16, 18],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS MGT AD)
+    (
+        4,
+        "mgt ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 24],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DJCS DOJVIC AD)
+    (
+        4,
+        "dojvic ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 24],
+        False,
+    ),
+    # Month - ASAE 3402 - Windows Privileged User Access Confirmation (PERIMETER AD)
+    (
+        4,
+        "perimeter ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 24],
+        False,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
+    (
+        5,
+        "internal ad acc",
+        [24, 0, 3, 5, 6, 7, 26, 27],
+        False,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
+    (
+        5,
+        "workgroup local acc",
+        [18, 0, 5, 7, 4, 8, 19, 21],
+        False,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS-SERVICE Local Acc)
+    (
+        5,
+        "service local acc",
+        [16, 0, 5, 6, 6, 6, 17, 19],
+        True,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
+    (
+        5,
+        "service ad acc",
+        [22, 0, 3, 5, 6, 7, 23, 28],
+        False,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS MGT Local)
+    (
+        5,
+        "mgt local acc",
+        [15, 0, 5, 6, 4, 7, 16, 18],
+        False,
+    ),
+    # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS MGT AD)
+    (
+        5,
+        "mgt ad acc",
+        [21, 0, 3, 5, 6, 7, 22, 27],
+        False,
+    ),
+]
 
 
 def get_id(request) -> str:
@@ -84,38 +417,206 @@ async def get_api_headers(session, *args, **kwargs):
         return (await resp.json())["access_token"]
 
 
+async def get_graph_api_headers(session):
+    if (
+        state["graph_api_headers"] is not None
+        and state["graph_api_headers_expiry"] > monotonic()
+    ):
+        return state["graph_api_headers"]
+    (graph_api_headers,) = await asyncio.gather(
+        *(
+            get_api_headers(session, *param)
+            for param in [
+                [
+                    "GRAPH_CLIENT_ID",
+                    "GRAPH_CLIENT_SECRET",
+                    "https://graph.microsoft.com/.default",
+                    f"https://login.microsoftonline.com/{os.environ['TENANT_ID']}/oauth2/v2.0/token",
+                ]
+            ]
+        )
+    )
+    state["graph_api_headers"] = graph_api_headers
+    state["graph_api_headers_expiry"] = monotonic() + graph_token_ttl
+    return graph_api_headers
+
+
+async def get_session():
+    import aiohttp
+
+    if state["session"] is None or state["session"].closed:
+        state["session"] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ttl_dns_cache=300, keepalive_timeout=60)
+        )
+    return state["session"]
+
+
 async def fetch_data(session, url, headers):
     async with session.get(url=url, headers=headers) as resp:
         return await resp.json()
 
 
-async def download_file(session, file_name, download_url):
+async def download_file(session, file_name, download_url, directory=None):
+    import aiofiles
+
+    directory = directory or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    temp_file_path = os.path.join(directory, file_name)
+    partial_file_path = f"{temp_file_path}.{uuid.uuid4().hex}.tmp"
     async with session.get(url=download_url) as resp:
-        temp_file_path = os.path.join(
-            tempfile.gettempdir(),
-            file_name,
+        resp.raise_for_status()
+        content = await resp.content.read()
+    async with aiofiles.open(partial_file_path, "wb") as temp_file:
+        await temp_file.write(content)
+    os.replace(partial_file_path, temp_file_path)
+    return temp_file_path
+
+
+def prune_downloaded_workbooks():
+    for name in os.listdir(downloaded_workbooks_path):
+        directory = os.path.join(downloaded_workbooks_path, name)
+        try:
+            if os.path.getmtime(directory) < (
+                datetime.now().timestamp() - downloaded_workbooks_ttl
+            ):
+                shutil.rmtree(directory)
+        except FileNotFoundError:
+            pass
+
+
+async def upload_file(session, upload_url, headers, file_content):
+    async with session.put(url=upload_url, headers=headers, data=file_content) as resp:
+        return resp.status
+
+
+async def fetch_drive_children(session, graph_api_headers, path):
+    drive_id = os.environ["DRIVE_ID"]
+    parent_path, _, name = path.rpartition("/")
+    # The configured root is resolved by path, folders below it by id.
+    if path.lower().startswith(f"{unquote(os.environ['URL'])}/".lower()):
+        parent_children = await get_drive_children(
+            session, graph_api_headers, parent_path
+        )
+        item_id = next(
+            (c["id"] for c in parent_children if c["name"].lower() == name.lower()),
+            None,
+        )
+        if item_id is None:
+            raise FileNotFoundError(path)
+        children_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/items/{item_id}/children"
+    else:
+        children_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{quote(path)}:/children"
+    children_url += "?$select=id,name,createdDateTime&$top=999"
+    children = []
+    while children_url:
+        children_data = await fetch_data(session, children_url, graph_api_headers)
+        children.extend(children_data["value"])
+        children_url = children_data.get("@odata.nextLink")
+    return children
+
+
+async def get_drive_children(session, graph_api_headers, path, refresh=False):
+    cached = drive_item_cache.get(path)
+    if refresh or cached is None or cached[0] <= monotonic():
+        cached = drive_item_cache[path] = (
+            monotonic() + drive_item_cache_ttl,
+            asyncio.ensure_future(
+                fetch_drive_children(session, graph_api_headers, path)
+            ),
         )
-        async with aiofiles.open(temp_file_path, "wb") as temp_file:
-            await temp_file.write(await resp.content.read())
-        return temp_file_path
+    try:
+        return await asyncio.shield(cached[1])
+    except Exception:
+        if drive_item_cache.get(path) is cached:
+            del drive_item_cache[path]
+        raise
+
+
+def get_workbook_names(names, file_pattern):
+    file_name = next((name for name in names if file_pattern in name), None)
+    if file_name is None:
+        return None, None
+    # The workbook actually read and written is the "Test - " copy.
+    return file_name, f"Test - {file_name}"
+
+
+async def get_file_item(session, month, folder_name, file_pattern, graph_api_headers):
+    folder_path = f"{unquote(os.environ['URL'])}/{month}/{unquote(folder_name)}"
+    for refresh in [False, True]:
+        children = await get_drive_children(
+            session, graph_api_headers, folder_path, refresh
+        )
+        file_name, item_name = get_workbook_names(
+            [c["name"] for c in children], file_pattern
+        )
+        file_item = next((c for c in children if c["name"] == item_name), None)
+        if file_item is not None:
+            return file_name, file_item
+    raise FileNotFoundError(f"{folder_path}/{item_name or file_pattern}")
 
 
 async def download_file_async(
-    session, drive_id, month, folder_name, file_pattern, graph_api_headers, url
+    session, month, folder_name, file_pattern, graph_api_headers
 ):
-    folder_month_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{url}/{month}/{folder_name}:/children"
-    folder_month_data = await fetch_data(session, folder_month_url, graph_api_headers)
-    file_name = next(
-        f["name"] for f in folder_month_data["value"] if file_pattern in f["name"]
+    file_name, file_item = await get_file_item(
+        session, month, folder_name, file_pattern, graph_api_headers
     )
-    file_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{url}/{month}/{folder_name}/Test - {file_name}?select=id,@microsoft.graph.downloadUrl"
+    file_url = f"https://graph.microsoft.com/v1.0/drives/{os.environ['DRIVE_ID']}/items/{file_item['id']}?select=id,cTag,@microsoft.graph.downloadUrl"
     file_data = await fetch_data(session, file_url, graph_api_headers)
+    # Workbooks are kept per content tag, so unchanged files downloaded by the
+    # warmup or an earlier /load are reused.
+    directory = os.path.join(
+        downloaded_workbooks_path,
+        hashlib.sha1(file_data["cTag"].encode("utf-8")).hexdigest()[:16],
+    )
+    # Only complete workbooks are reused, anything else is downloaded again.
+    if zipfile.is_zipfile(os.path.join(directory, file_name)):
+        os.utime(directory)
+        return os.path.join(directory, file_name)
     temp_file_path = await download_file(
-        session, file_name, file_data["@microsoft.graph.downloadUrl"]
+        session, file_name, file_data["@microsoft.graph.downloadUrl"], directory
     )
+    prune_downloaded_workbooks()
     return temp_file_path
 
 
+async def get_month_folders(session, graph_api_headers, month_count=2):
+    return sorted(
+        await get_drive_children(
+            session, graph_api_headers, unquote(os.environ["URL"])
+        ),
+        key=lambda month_folder: month_folder["createdDateTime"],
+        reverse=True,
+    )[:month_count]
+
+
+async def get_months(session, graph_api_headers, month_count=2):
+    return [
+        month_folder["name"]
+        for month_folder in await get_month_folders(
+            session, graph_api_headers, month_count
+        )
+    ]
+
+
+async def download_files(session, graph_api_headers, month_count=2):
+    months = await get_months(session, graph_api_headers, month_count)
+    downloaded_files = await asyncio.gather(
+        *(
+            download_file_async(
+                session,
+                month,
+                pattern[0],
+                pattern[1],
+                graph_api_headers,
+            )
+            for month in months
+            for pattern in patterns
+        )
+    )
+    return months, downloaded_files
+
+
 def save_downloaded_files_to_file(downloaded_files):
     with open(downloaded_files_path, "w") as file:
         file.write("\n".join(downloaded_files))
@@ -128,378 +629,216 @@ def load_downloaded_files_from_file():
     return None
 
 
-async def process_sheet_async(
-    file_index,
-    file_path_current,
-    file_path_previous,
-    sheet_pattern,
-    column_indices,
-    reviewer_name,
-    remove_lastname,
-):
-    def process_sheet_sync():
-        sheet_index_previous = [
-            index
-            for index, name in enumerate(pd.ExcelFile(file_path_previous).sheet_names)
-            if sheet_pattern in name.lower()
-        ][0]
-        sheet_name_previous = pd.ExcelFile(file_path_previous).sheet_names[
-            sheet_index_previous
-        ]
-        df_previous = pd.read_excel(file_path_previous, sheet_name=sheet_name_previous)
-        df_previous.replace({np.nan: ""}, inplace=True)
-        df_previous["ID"] = "ID"
-        df_previous = df_previous[["ID"] + list(df_previous.columns[:-1])]
-        df_previous = df_previous[
-            df_previous.iloc[:, column_indices[0]]
-            .str.lower()
-            .str.contains(reviewer_name)
-        ].iloc[
-            :,
-            column_indices[1:],
-        ]
-        df_previous.columns = [
-            "ID",
-            "Group",
-            "Username",
-            "Firstname",
-            "Lastname",
-            "LastApproval",
-            "Remark",
-        ]
-        df_previous = df_previous.iloc[:, [1, 2, 3, 5]]
-
-        sheet_index_current = [
-            index
-            for index, name in enumerate(pd.ExcelFile(file_path_current).sheet_names)
-            if sheet_pattern in name.lower()
-        ][0]
-        sheet_name_current = pd.ExcelFile(file_path_current).sheet_names[
-            sheet_index_current
-        ]
-        df_current = pd.read_excel(file_path_current, sheet_name=sheet_name_current)
-        df_current.replace({np.nan: ""}, inplace=True)
-        df_current["ID"] = f"{file_index}/{sheet_index_current}/" + (
-            df_current.index + 2
-        ).astype(str)
-        df_current = df_current[["ID"] + list(df_current.columns[:-1])]
-        df_current = df_current[
-            df_current.iloc[:, column_indices[0]]
-            .str.lower()
-            .str.contains(reviewer_name)
-        ].iloc[
-            :,
-            column_indices[1:],
+@contextmanager
+def persisted_values_lock():
+    import fcntl
+
+    with open(f"{persisted_values_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def load_persisted_values():
+    try:
+        with open(persisted_values_path, "r") as file:
+            persisted_values = json.load(file)
+        if "values" in persisted_values:
+            return persisted_values
+    except FileNotFoundError:
+        pass
+    return {"month": None, "values": {}, "patched": {}}
+
+
+def save_persisted_values(persisted_values):
+    with open(f"{persisted_values_path}.{os.getpid()}.tmp", "w") as file:
+        json.dump(persisted_values, file)
+    os.replace(f"{persisted_values_path}.{os.getpid()}.tmp", persisted_values_path)
+
+
+def replace_persisted_values(month, download_started, values):
+    with persisted_values_lock():
+        persisted_values = load_persisted_values()
+        patched = {}
+        if persisted_values["month"] == month:
+            # Keep values written by /update after this /load began downloading,
+            # its workbooks may predate them.
+            for cell_id, patched_at in persisted_values["patched"].items():
+                if patched_at >= download_started:
+                    values[cell_id] = persisted_values["values"][cell_id]
+                    patched[cell_id] = patched_at
+        save_persisted_values({"month": month, "values": values, "patched": patched})
+
+
+def update_persisted_values(month, submissions):
+    with persisted_values_lock():
+        persisted_values = load_persisted_values()
+        if persisted_values["month"] != month:
+            persisted_values = {"month": month, "values": {}, "patched": {}}
+        patched_at = datetime.now().timestamp()
+        for edits, _, _ in submissions:
+            for cell_id, edit in edits.items():
+                values = persisted_values["values"].setdefault(cell_id, [None, None])
+                for key, value_index in [("approval", 0), ("remark", 1)]:
+                    if key in edit:
+                        values[value_index] = str(edit[key])
+                persisted_values["patched"][cell_id] = patched_at
+        save_persisted_values(persisted_values)
+
+
+def get_load_version(df):
+    import pandas as pd
+
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(df, index=False).values.tobytes()
+    ).hexdigest()[:16]
+
+
+def save_load_snapshot(version, df):
+    os.makedirs(load_versions_path, exist_ok=True)
+    snapshot_path = os.path.join(load_versions_path, f"{version}.pkl")
+    if os.path.exists(snapshot_path):
+        os.utime(snapshot_path)
+    else:
+        df.to_pickle(f"{snapshot_path}.{os.getpid()}.tmp")
+        os.replace(f"{snapshot_path}.{os.getpid()}.tmp", snapshot_path)
+    snapshot_paths = sorted(
+        (
+            os.path.join(load_versions_path, name)
+            for name in os.listdir(load_versions_path)
+            if name.endswith(".pkl")
+        ),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for stale_path in snapshot_paths[load_versions_limit:]:
+        try:
+            os.remove(stale_path)
+        except FileNotFoundError:
+            pass
+
+
+def load_load_snapshot(version):
+    import pandas as pd
+
+    if not re.fullmatch(r"[0-9a-f]{16}", version):
+        return None
+    try:
+        return pd.read_pickle(os.path.join(load_versions_path, f"{version}.pkl"))
+    except FileNotFoundError:
+        return None
+
+
+def get_load_delta(df_previous, df_current):
+    df_previous = df_previous.set_index("ID")
+    df_current = df_current.set_index("ID")
+    added = df_current.index.difference(df_previous.index, sort=False)
+    removed = df_previous.index.difference(df_current.index, sort=False)
+    common = df_current.index.intersection(df_previous.index, sort=False)
+    if list(df_previous.columns) == list(df_current.columns):
+        changed = common[
+            (
+                df_current.loc[common].astype(str)
+                != df_previous.loc[common].astype(str)
+            )
+            .any(axis=1)
+            .values
         ]
-        df_current["Filename"] = file_path_current.split("/")[2].split(".")[0]
-        df_current["Sheetname"] = sheet_name_current
-        df_current.columns = [
-            "ID",
-            "Group",
-            "Username",
-            "Firstname",
-            "Lastname",
-            "Approval",
-            "Remark",
-            "Filename",
-            "Sheetname",
+    else:
+        changed = common
+    return {
+        "added": df_current.loc[added].reset_index().to_dict(orient="records"),
+        "removed": list(removed),
+        "changed": df_current.loc[changed].reset_index().to_dict(orient="records"),
+    }
+
+
+def get_history_partition_path(month_name, file_index, sheet_pattern):
+    return os.path.join(
+        history_path,
+        f"month={quote(month_name, safe='')}",
+        f"sheet={file_index}-{quote(sheet_pattern, safe='')}",
+        "part-0.parquet",
+    )
+
+
+def append_history(month_folder, file_index, sheet_pattern, sheet_name, df):
+    import pandas as pd
+
+    partition_path = get_history_partition_path(
+        month_folder["name"], file_index, sheet_pattern
+    )
+    if os.path.exists(partition_path):
+        return
+    df = df.astype(str)
+    for column in ["Reviewer", "Group", "Username"]:
+        df[column] = df[column].astype("category")
+    df.insert(0, "Month", month_folder["name"])
+    df.insert(1, "MonthCreated", pd.Timestamp(month_folder["createdDateTime"]))
+    df.insert(2, "Sheetname", sheet_name)
+    os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+    partial_partition_path = f"{partition_path}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(partial_partition_path, index=False)
+    os.replace(partial_partition_path, partition_path)
+
+
+def read_history(user=None, group=None, reviewer=None, month=None, limit=12):
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(history_path):
+        return []
+    dataset = ds.dataset(history_path, format="parquet", partitioning="hive")
+    filters = [
+        pc.utf8_lower(pc.field(column).cast("string")) == value.lower()
+        for column, value in [
+            ("Username", user),
+            ("Group", group),
+            ("Reviewer", reviewer),
         ]
-        df = pd.merge(
-            left=df_current,
-            right=df_previous,
-            left_on=[
-                df_current.columns[1],
-                df_current.columns[2],
-                df_current.columns[3],
-            ],
-            right_on=[
-                df_previous.columns[0],
-                df_previous.columns[1],
-                df_previous.columns[2],
-            ],
-            how="left",
-            indicator=False,
-        )
-        if remove_lastname:
-            df["Lastname"] = ""
-        df.replace({np.nan: ""}, inplace=True)
-        return df
+        if value
+    ]
+    if month:
+        filters.append(pc.field("month") == month)
+    df = dataset.to_table(
+        columns=[
+            name for name in dataset.schema.names if name not in ["month", "sheet"]
+        ],
+        filter=functools.reduce(lambda left, right: left & right, filters)
+        if filters
+        else None,
+    ).to_pandas()
+    df.sort_values(
+        by=["MonthCreated", "Sheetname"],
+        ascending=[False, True],
+        inplace=True,
+    )
+    df["MonthCreated"] = df["MonthCreated"].astype(str)
+    return df.head(limit).astype(object).to_dict(orient="records")
 
-    with ThreadPoolExecutor() as executor:
-        return await asyncio.get_event_loop().run_in_executor(
-            executor, process_sheet_sync
-        )
 
+def share_categories(frames):
+    import numpy as np
+    import pandas as pd
 
-@app.get("/load")
-async def load():
-    async with aiohttp.ClientSession() as session:
-        (graph_api_headers,) = await asyncio.gather(
-            *(
-                get_api_headers(session, *param)
-                for param in [
-                    [
-                        "GRAPH_CLIENT_ID",
-                        "GRAPH_CLIENT_SECRET",
-                        "https://graph.microsoft.com/.default",
-                        f"https://login.microsoftonline.com/{os.environ['TENANT_ID']}/oauth2/v2.0/token",
-                    ]
-                ]
+    for column, sort_categories in categorical_columns.items():
+        categories = pd.unique(
+            np.concatenate(
+                [np.asarray(df[column].cat.categories, dtype=object) for df in frames]
+                + [np.array(["", "Y"], dtype=object)]
             )
         )
-        drive_id, url = os.environ["DRIVE_ID"], os.environ["URL"]
-        folder_url = (
-            f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{url}:/children"
-        )
-        folder_data = await fetch_data(session, folder_url, graph_api_headers)
-        df = pd.DataFrame(folder_data["value"])
-        df = df.sort_values(by="createdDateTime", ascending=False)
-        download_coroutines = []
-        for month in [
-            df["name"].iloc[0].replace(" ", "%20"),
-            df["name"].iloc[1].replace(" ", "%20"),
-        ]:
-            for pattern in patterns:
-                coroutine = download_file_async(
-                    session,
-                    drive_id,
-                    month,
-                    pattern[0],
-                    pattern[1],
-                    graph_api_headers,
-                    url,
-                )
-                download_coroutines.append(coroutine)
+        if sort_categories:
+            # Same mixed-type safe order sort_values uses for object columns.
+            categories = pd.Categorical(categories).categories
+        for df in frames:
+            df[column] = df[column].cat.set_categories(categories)
+    return frames
 
-        downloaded_files = await asyncio.gather(*download_coroutines)
-        save_downloaded_files_to_file(downloaded_files)
 
-    processing_coroutines = [
-        process_sheet_async(
-            file_index,
-            downloaded_files[file_index],
-            downloaded_files[file_index + len(patterns)],
-            sheet_pattern,
-            column_indices,
-            "jamero",
-            remove_lastname,
-        )
-        for file_index, sheet_pattern, column_indices, remove_lastname in [
-            # Month UAR - SOC 2 - CyberArk Privileged Users Confirmation (CyberArk)
-            (
-                0,
-                "cyberark",
-                [5, 0, 1, 2, 3, 4, 7, 9],
-                False,
-            ),
-            # Month - SOC 2 - Security Tools Privileged User Access Confirmation (Cylance)
-            (
-                1,
-                "cylance",
-                [12, 0, 5, 10, 3, 4, 14, 16],
-                False,
-            ),
-            # Month - SOC 2 - Security Tools Privileged User Access Confirmation (PKI Server Review)
-            (
-                1,
-                "pki",
-                [13, 0, 1, 3, 4, 5, 15, 17],
-                False,
-            ),
-            # Month - UAR-SOC 2 Services - Access Confirmation (GO Desktop 365-SCCM)
-            (
-                2,
-                "go desktop 365-sccm",
-                [17, 0, 1, 4, 5, 8, 19, 21],
-                False,
-            ),
-            # Month - UAR-SOC 2 Services - Access Confirmation (Go Office 365 additional groups)
-            (
-                2,
-                "go office 365 additional groups",
-                [4, 0, 1, 2, 2, 2, 3, 6],
-                True,
-            ),
-            # Month - UAR-SOC 2 Services - Access Confirmation (Go Office 365)
-            (
-                2,
-                "go office",
-                [11, 0, 1, 3, 2, 2, 13, 15],
-                True,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
-            (
-                3,
-                "internal ad acc",
-                [24, 0, 3, 5, 6, 7, 26, 28],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP- DOI  AD)
-            (
-                3,
-                "doi ad acc",
-                [22, 0, 3, 5, 6, 7, 23, 25],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
-            (
-                3,
-                "workgroup local acc",
-                [18, 0, 5, 7, 8, 8, 19, 21],
-                True,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
-            (
-                3,
-                "service ad acc",
-                [22, 0, 3, 5, 6, 7, 23, 28],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (DJCS DOJVIC AD)
-            (
-                3,
-                "dojvic  ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 27],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (PERIMETER AD)
-            (
-                3,
-                "perimeter ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 27],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (CA Local)
-            (
-                3,
-                "ca local acc",
-                [15, 0, 5, 6, 2, 7, 16, 18],
-                False,
-            ),
-            # Month UAR - SOC 2 - Windows Privileged User Access Confirmation (CA AD)
-            (
-                3,
-                "ca ad acc",
-                [22, 0, 3, 5, 6, 7, 23, 25],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP-INTERNAL  Local)
-            (
-                4,
-                "internal local acc",
-                [15, 0, 5, 6, 7, 7, 17, 19],
-                True,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
-            (
-                4,
-                "internal ad acc",
-                [26, 0, 3, 5, 6, 7, 28, 30],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- DOI  AD)
-            (
-                4,
-                "doi ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 24],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP- DOI  Local)
-            (
-                4,
-                "doi local acc",
-                [16, 0, 5, 6, 7, 7, 17, 19],
-                True,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
-            (
-                4,
-                "workgroup local acc",
-                [18, 0, 5, 7, 8, 8, 19, 21],
-                True,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
-            (
-                4,
-                "service ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 24],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS MGT Local)
-            (
-                4,
-                "mgt local acc",
-                [15, 0, 5, 6, 4, 7, 16, 18],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DHHS MGT AD)
-            (
-                4,
-                "mgt ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 24],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (DJCS DOJVIC AD)
-            (
-                4,
-                "dojvic ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 24],
-                False,
-            ),
-            # Month - ASAE 3402 - Windows Privileged User Access Confirmation (PERIMETER AD)
-            (
-                4,
-                "perimeter ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 24],
-                False,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (GSP- INTERNAL  AD)
-            (
-                5,
-                "internal ad acc",
-                [24, 0, 3, 5, 6, 7, 26, 27],
-                False,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (GSP-Workgroup Local Acc)
-            (
-                5,
-                "workgroup local acc",
-                [18, 0, 5, 7, 4, 8, 19, 21],
-                False,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS-SERVICE Local Acc)
-            (
-                5,
-                "service local acc",
-                [16, 0, 5, 6, 6, 6, 17, 19],
-                True,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS-SERVICE AD)
-            (
-                5,
-                "service ad acc",
-                [22, 0, 3, 5, 6, 7, 23, 28],
-                False,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS MGT Local)
-            (
-                5,
-                "mgt local acc",
-                [15, 0, 5, 6, 4, 7, 16, 18],
-                False,
-            ),
-            # Month UAR - 3150 - Windows Privileged User Access Confirmation (DHHS MGT AD)
-            (
-                5,
-                "mgt ad acc",
-                [21, 0, 3, 5, 6, 7, 22, 27],
-                False,
-            ),
-        ]
-        if file_index < len(patterns)
-    ]
-    processed_data = await asyncio.gather(*processing_coroutines)
-    df = pd.concat(processed_data, axis=0, ignore_index=True)
+def merge_sheets(processed_data):
+    import pandas as pd
+
+    df = pd.concat(share_categories(processed_data), axis=0, ignore_index=True)
     df.loc[
         df["Firstname"]
         .str.lower()
@@ -538,317 +877,594 @@ async def load():
         ascending=[True, True, True, True],
         inplace=True,
     )
-    return df.to_dict(orient="records")
+    return df
 
 
-async def modify_file(file_index, file_path, data, id, time):
-    workbook = load_workbook(file_path)
-    for cell_id, approval in data["data"]["approvals"].items():
-        index, sheet_index, row_number = map(int, cell_id.split("/"))
-        if index == file_index:
-            sheet = workbook.worksheets[sheet_index]
-            row = sheet[row_number]
-            if file_index == 0 and "cyberark" in sheet.title.lower():
-                row[5].value = time
-                row[6].value = approval
-                row[9].value = id
-                row[10].value = time
-            elif file_index == 1 and "cylance" in sheet.title.lower():
-                row[12].value = time
-                row[13].value = approval
-                row[16].value = id
-                row[17].value = time
-            elif file_index == 1 and "pki" in sheet.title.lower():
-                row[13].value = time
-                row[14].value = approval
-                row[17].value = id
-                row[18].value = time
-            elif file_index == 2 and "go desktop 365-sccm" in sheet.title.lower():
-                row[17].value = time
-                row[18].value = approval
-                row[21].value = id
-                row[22].value = time
-            elif (
-                file_index == 2
-                and "go office 365 additional groups" in sheet.title.lower()
-            ):
-                row[4].value = time
-                row[2].value = approval
-                row[6].value = id
-                row[7].value = time
-            elif file_index == 2 and "go office" in sheet.title.lower():
-                row[11].value = time
-                row[12].value = approval
-                row[15].value = id
-                row[16].value = time
-            elif file_index == 3 and "internal ad acc" in sheet.title.lower():
-                row[24].value = time
-                row[25].value = approval
-                row[28].value = id
-                row[29].value = time
-            elif file_index == 3 and "doi ad acc" in sheet.title.lower():
-                row[20].value = time
-                row[22].value = approval
-                row[25].value = id
-                row[26].value = time
-            elif file_index == 3 and "workgroup local acc" in sheet.title.lower():
-                row[16].value = time
-                row[18].value = approval
-                row[21].value = id
-                row[22].value = time
-            elif file_index == 3 and "service ad acc" in sheet.title.lower():
-                row[20].value = time
-                row[22].value = approval
-                row[25].value = id
-                row[26].value = time
-            elif file_index == 3 and "dojvic  ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 3 and "perimeter ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 3 and "ca local acc" in sheet.title.lower():
-                row[13].value = time
-                row[15].value = approval
-                row[18].value = id
-                row[19].value = time
-            elif file_index == 3 and "ca ad acc" in sheet.title.lower():
-                row[20].value = time
-                row[22].value = approval
-                row[25].value = id
-                row[26].value = time
-            elif file_index == 4 and "internal local acc" in sheet.title.lower():
-                row[15].value = time
-                row[16].value = approval
-                row[19].value = id
-                row[20].value = time
-            elif file_index == 4 and "internal ad acc" in sheet.title.lower():
-                row[26].value = time
-                row[27].value = approval
-                row[30].value = id
-                row[31].value = time
-            elif file_index == 4 and "doi ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 4 and "doi local acc" in sheet.title.lower():
-                row[14].value = time
-                row[16].value = approval
-                row[19].value = id
-                row[20].value = time
-            elif file_index == 4 and "workgroup local acc" in sheet.title.lower():
-                row[16].value = time
-                row[18].value = approval
-                row[21].value = id
-                row[22].value = time
-            elif file_index == 4 and "service ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 4 and "mgt local acc" in sheet.title.lower():
-                row[13].value = time
-                row[15].value = approval
-                row[18].value = id
-                row[19].value = time
-            elif file_index == 4 and "mgt ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 4 and "dojvic ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 4 and "perimeter ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-            elif file_index == 5 and "internal ad acc" in sheet.title.lower():
-                row[24].value = time
-                row[25].value = approval
-                row[28].value = id
-                row[29].value = time
-            elif file_index == 5 and "workgroup local acc" in sheet.title.lower():
-                row[16].value = time
-                row[18].value = approval
-                row[21].value = id
-                row[22].value = time
-            elif file_index == 5 and "service local acc" in sheet.title.lower():
-                row[14].value = time
-                row[16].value = approval
-                row[19].value = id
-                row[20].value = time
-            elif file_index == 5 and "service ad acc" in sheet.title.lower():
-                row[20].value = time
-                row[22].value = approval
-                row[25].value = id
-                row[26].value = time
-            elif file_index == 5 and "mgt local acc" in sheet.title.lower():
-                row[13].value = time
-                row[15].value = approval
-                row[18].value = id
-                row[19].value = time
-            elif file_index == 5 and "mgt ad acc" in sheet.title.lower():
-                row[19].value = time
-                row[21].value = approval
-                row[24].value = id
-                row[25].value = time
-
-    for cell_id, remark in data["data"]["remarks"].items():
-        index, sheet_index, row_number = map(int, cell_id.split("/"))
-        if index == file_index:
-            sheet = workbook.worksheets[sheet_index]
-            row = sheet[row_number]
-            if file_index == 0 and "cyberark" in sheet.title.lower():
-                row[8].value = remark
-            elif file_index == 1 and "cylance" in sheet.title.lower():
-                row[15].value = remark
-            elif file_index == 1 and "pki" in sheet.title.lower():
-                row[16].value = remark
-            elif file_index == 2 and "go desktop 365-sccm" in sheet.title.lower():
-                row[20].value = remark
-            elif (
-                file_index == 2
-                and "go office 365 additional groups" in sheet.title.lower()
+def process_sheet(
+    file_index,
+    file_path_current,
+    file_path_previous,
+    sheet_pattern,
+    column_indices,
+    reviewer_name,
+    remove_lastname,
+    month_folder_previous=None,
+    file_name_current=None,
+):
+    import pandas as pd
+
+    def read_sheet(file_path):
+        with pd.ExcelFile(file_path) as excel_file:
+            sheet_index, sheet_name = next(
+                (
+                    (index, name)
+                    for index, name in enumerate(excel_file.sheet_names)
+                    if sheet_pattern in name.lower()
+                ),
+                (None, None),
+            )
+            if sheet_name is None:
+                raise ValueError(
+                    f"No sheet matching {sheet_pattern!r} in {os.path.basename(file_path)}"
+                )
+            df = excel_file.parse(sheet_name=sheet_name)
+        return sheet_index, sheet_name, df
+
+    def select_rows(df, id):
+        df.insert(0, "ID", id)
+        mask = (
+            df.iloc[:, column_indices[0]]
+            .fillna("")
+            .astype(str)
+            .str.lower()
+            .str.contains(reviewer_name)
+        )
+        return df.iloc[mask.values, column_indices[1:]].fillna("")
+
+    sheet_index_previous, sheet_name_previous, df_previous = read_sheet(
+        file_path_previous
+    )
+    if month_folder_previous is not None:
+        df_history = df_previous.iloc[
+            :, [column_indices[0] - 1, *(i - 1 for i in column_indices[2:])]
+        ].fillna("")
+        df_history.columns = [
+            "Reviewer",
+            "Group",
+            "Username",
+            "Firstname",
+            "Lastname",
+            "Approval",
+            "Remark",
+        ]
+        if remove_lastname:
+            df_history["Lastname"] = ""
+        try:
+            append_history(
+                month_folder_previous,
+                file_index,
+                sheet_pattern,
+                sheet_name_previous,
+                df_history,
+            )
+        except Exception:
+            logger.exception(
+                "Failed to append history for %s %s",
+                month_folder_previous["name"],
+                sheet_pattern,
+            )
+    df_previous = select_rows(df_previous, "ID")
+    df_previous.columns = [
+        "ID",
+        "Group",
+        "Username",
+        "Firstname",
+        "Lastname",
+        "LastApproval",
+        "Remark",
+    ]
+    # One previous row per key keeps the merge at one row per current ID.
+    df_previous = df_previous.iloc[:, [1, 2, 3, 5]].drop_duplicates(
+        subset=["Group", "Username", "Firstname"]
+    )
+
+    sheet_index_current, sheet_name_current, df_current = read_sheet(
+        file_path_current
+    )
+    df_current = select_rows(
+        df_current,
+        f"{file_index}/{sheet_index_current}/"
+        + (df_current.index + 2).astype(str),
+    )
+    df_current.columns = [
+        "ID",
+        "Group",
+        "Username",
+        "Firstname",
+        "Lastname",
+        "Approval",
+        "Remark",
+    ]
+    df = pd.merge(
+        left=df_current,
+        right=df_previous,
+        on=["Group", "Username", "Firstname"],
+        how="left",
+        indicator=False,
+    )
+    if remove_lastname:
+        df["Lastname"] = ""
+    df.insert(
+        7,
+        "Filename",
+        (file_name_current or os.path.basename(file_path_current)).split(".")[0],
+    )
+    df.insert(8, "Sheetname", sheet_name_current)
+    df["LastApproval"] = df["LastApproval"].fillna("")
+    for column in categorical_columns:
+        df[column] = df[column].astype("category")
+    return df
+
+
+async def process_sheet_async(*args):
+    with ThreadPoolExecutor() as executor:
+        return await asyncio.get_event_loop().run_in_executor(
+            executor, functools.partial(process_sheet, *args)
+        )
+
+
+def is_profile_authorised(request):
+    profile_token = os.environ.get("PROFILE_TOKEN")
+    token = request.headers.get("X-Profile") or request.query_params.get("profile")
+    return bool(profile_token and token) and hmac.compare_digest(
+        token.encode("utf-8"), profile_token.encode("utf-8")
+    )
+
+
+def sample_stacks(stop, loop_thread_id, samples):
+    # Samples are weighted by the microseconds since the previous round, as the
+    # GIL can delay rounds well past the nominal interval.
+    sampled_at = monotonic()
+    while not stop.wait(profile_interval):
+        elapsed = round((monotonic() - sampled_at) * 1e6)
+        sampled_at = monotonic()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == loop_thread_id:
+                root = (
+                    "idle"
+                    if frame.f_code.co_name == "select"
+                    and frame.f_code.co_filename.endswith("selectors.py")
+                    else "event-loop"
+                )
+            elif thread_names.get(thread_id, "").startswith(
+                ("ThreadPoolExecutor", "asyncio")
             ):
-                row[5].value = remark
-            elif file_index == 2 and "go office" in sheet.title.lower():
-                row[14].value = remark
-            elif file_index == 3 and "internal ad acc" in sheet.title.lower():
-                row[27].value = remark
-            elif file_index == 3 and "doi ad acc" in sheet.title.lower():
-                row[24].value = remark
-            elif file_index == 3 and "workgroup local acc" in sheet.title.lower():
-                row[20].value = remark
-            elif file_index == 3 and "service ad acc" in sheet.title.lower():
-                row[27].value = remark
-            elif file_index == 3 and "dojvic  ad acc" in sheet.title.lower():
-                row[26].value = remark
-            elif file_index == 3 and "perimeter ad acc" in sheet.title.lower():
-                row[26].value = remark
-            elif file_index == 3 and "ca local acc" in sheet.title.lower():
-                row[17].value = remark
-            elif file_index == 3 and "ca ad acc" in sheet.title.lower():
-                row[24].value = remark
-            elif file_index == 4 and "internal local acc" in sheet.title.lower():
-                row[18].value = remark
-            elif file_index == 4 and "internal ad acc" in sheet.title.lower():
-                row[29].value = remark
-            elif file_index == 4 and "doi ad acc" in sheet.title.lower():
-                row[23].value = remark
-            elif file_index == 4 and "doi local acc" in sheet.title.lower():
-                row[18].value = remark
-            elif file_index == 4 and "workgroup local acc" in sheet.title.lower():
-                row[20].value = remark
-            elif file_index == 4 and "service ad acc" in sheet.title.lower():
-                row[23].value = remark
-            elif file_index == 4 and "mgt local acc" in sheet.title.lower():
-                row[17].value = remark
-            elif file_index == 4 and "mgt ad acc" in sheet.title.lower():
-                row[23].value = remark
-            elif file_index == 4 and "dojvic ad acc" in sheet.title.lower():
-                row[23].value = remark
-            elif file_index == 4 and "perimeter ad acc" in sheet.title.lower():
-                row[23].value = remark
-            elif file_index == 5 and "internal ad acc" in sheet.title.lower():
-                row[27].value = remark
-            elif file_index == 5 and "workgroup local acc" in sheet.title.lower():
-                row[20].value = remark
-            elif file_index == 5 and "service local acc" in sheet.title.lower():
-                row[18].value = remark
-            elif file_index == 5 and "service ad acc" in sheet.title.lower():
-                row[27].value = remark
-            elif file_index == 5 and "mgt local acc" in sheet.title.lower():
-                row[17].value = remark
-            elif file_index == 5 and "mgt ad acc" in sheet.title.lower():
-                row[26].value = remark
-
-    workbook.save(file_path)
-    workbook.close()
+                root = "executor"
+            else:
+                continue
+            if root == "executor" and frame.f_code.co_name == "_worker":
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(
+                    f"{frame.f_code.co_name} "
+                    f"({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+                )
+                frame = frame.f_back
+            samples[";".join([root, *reversed(stack)])] += elapsed
 
 
-@app.post("/update")
-async def update_data(request: Request, data: dict):
-    async with aiohttp.ClientSession() as session:
-        (graph_api_headers,) = await asyncio.gather(
-            *(
-                get_api_headers(session, *param)
-                for param in [
-                    [
-                        "GRAPH_CLIENT_ID",
-                        "GRAPH_CLIENT_SECRET",
-                        "https://graph.microsoft.com/.default",
-                        f"https://login.microsoftonline.com/{os.environ['TENANT_ID']}/oauth2/v2.0/token",
+def save_profile(path, samples):
+    os.makedirs(profiles_path, exist_ok=True)
+    profile_name = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{path.strip('/')}-{os.getpid()}.folded"
+    with open(os.path.join(profiles_path, profile_name), "w") as file:
+        file.write("".join(f"{stack} {count}\n" for stack, count in samples.items()))
+    for stale_name in sorted(os.listdir(profiles_path), reverse=True)[profiles_limit:]:
+        try:
+            os.remove(os.path.join(profiles_path, stale_name))
+        except FileNotFoundError:
+            pass
+    return profile_name
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if request.url.path not in ["/load", "/update"] or not is_profile_authorised(
+        request
+    ):
+        return await call_next(request)
+    samples, stop = Counter(), threading.Event()
+    sampler = threading.Thread(
+        target=sample_stacks,
+        args=(stop, threading.get_ident(), samples),
+        daemon=True,
+    )
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        stop.set()
+        sampler.join()
+    response.headers["X-Profile-Name"] = save_profile(request.url.path, samples)
+    return response
+
+
+@app.get("/profiles")
+async def list_profiles(request: Request):
+    if not is_profile_authorised(request):
+        return JSONResponse(status_code=403, content={"message": "Forbidden"})
+    profiles = []
+    for profile_name in sorted(
+        os.listdir(profiles_path) if os.path.isdir(profiles_path) else [],
+        reverse=True,
+    ):
+        samples = Counter()
+        with open(os.path.join(profiles_path, profile_name), "r") as file:
+            for line in file:
+                stack, _, count = line.rpartition(" ")
+                samples[stack.split(";")[0]] += int(count)
+        profiles.append(
+            {
+                "name": profile_name,
+                **{
+                    f"{key}_seconds": round(samples[root] / 1e6, 3)
+                    for key, root in [
+                        ("event_loop", "event-loop"),
+                        ("executor", "executor"),
+                        ("idle", "idle"),
                     ]
-                ]
-            )
+                },
+            }
         )
-        drive_id, url = os.environ["DRIVE_ID"], os.environ["URL"]
-        folder_url = (
-            f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{url}:/children"
+    return profiles
+
+
+@app.get("/profiles/{profile_name}")
+async def get_profile(request: Request, profile_name: str):
+    if not is_profile_authorised(request):
+        return JSONResponse(status_code=403, content={"message": "Forbidden"})
+    profile_path = os.path.join(profiles_path, profile_name)
+    if not re.fullmatch(r"[\w.-]+\.folded", profile_name) or not os.path.exists(
+        profile_path
+    ):
+        return JSONResponse(status_code=404, content={"message": "Not Found"})
+    with open(profile_path, "r") as file:
+        return PlainTextResponse(file.read())
+
+
+@app.get("/status")
+async def status():
+    if state["warm"]:
+        return {"status": "warm"}
+    return JSONResponse(status_code=503, content={"status": "cold"})
+
+
+@app.get("/load")
+async def load(response: Response, version: str = None):
+    session = await get_session()
+    graph_api_headers = await get_graph_api_headers(session)
+    download_started = datetime.now().timestamp()
+    months, downloaded_files = await download_files(session, graph_api_headers)
+    save_downloaded_files_to_file(downloaded_files)
+    _, month_folder_previous = await get_month_folders(session, graph_api_headers)
+
+    processing_coroutines = [
+        process_sheet_async(
+            file_index,
+            downloaded_files[file_index],
+            downloaded_files[file_index + len(patterns)],
+            sheet_pattern,
+            column_indices,
+            "jamero",
+            remove_lastname,
+            month_folder_previous,
         )
-        folder_data = await fetch_data(session, folder_url, graph_api_headers)
-        df = pd.DataFrame(folder_data["value"])
-        df = df.sort_values(by="createdDateTime", ascending=False)
-        download_coroutines = []
-        for month in [
-            df["name"].iloc[0].replace(" ", "%20"),
-            df["name"].iloc[1].replace(" ", "%20"),
-        ]:
-            for pattern in patterns:
-                coroutine = download_file_async(
-                    session,
-                    drive_id,
-                    month,
-                    pattern[0],
-                    pattern[1],
-                    graph_api_headers,
-                    url,
-                )
-                download_coroutines.append(coroutine)
-
-        downloaded_files = await asyncio.gather(*download_coroutines)
-        save_downloaded_files_to_file(downloaded_files)
-        id = data["data"]["userInfo"].split("@")[0].replace(".", " ").title()
-        time = datetime.now().strftime("%d/%m/%Y")
-        modification_tasks = []
-        for file_index, file_path in enumerate(
-            downloaded_files[: len(downloaded_files) // 2]
+        for file_index, sheet_pattern, column_indices, remove_lastname in sheet_specs
+        if file_index < len(patterns)
+    ]
+    processed_data = await asyncio.gather(*processing_coroutines)
+    await asyncio.get_event_loop().run_in_executor(
+        None,
+        replace_persisted_values,
+        months[0],
+        download_started,
+        {
+            cell_id: [str(approval), str(remark)]
+            for df in processed_data
+            for cell_id, approval, remark in zip(
+                df["ID"], df["Approval"], df["Remark"]
+            )
+        },
+    )
+    df = merge_sheets(processed_data)
+    load_version = get_load_version(df)
+    df_previous = load_load_snapshot(version) if version else None
+    save_load_snapshot(load_version, df)
+    response.headers["X-Load-Version"] = load_version
+    if df_previous is None or not df_previous["ID"].is_unique:
+        return df.to_dict(orient="records")
+    return {"version": load_version, **get_load_delta(df_previous, df)}
+
+
+def get_cell_text(cell):
+    return "" if cell.value is None else str(cell.value)
+
+
+def get_write_columns(file_index, sheet):
+    return next(
+        (
+            columns
+            for index, sheet_pattern, columns in write_specs
+            if index == file_index and sheet_pattern in sheet.title.lower()
+        ),
+        None,
+    )
+
+
+class InvalidCellIdError(Exception):
+    pass
+
+
+def get_invalid_cell_id(file_index, workbook, edits):
+    for cell_id in edits:
+        _, sheet_index, row_number = map(int, cell_id.split("/"))
+        if (
+            sheet_index >= len(workbook.worksheets)
+            or row_number > workbook.worksheets[sheet_index].max_row
+            or get_write_columns(file_index, workbook.worksheets[sheet_index]) is None
+        ):
+            return cell_id
+    return None
+
+
+def modify_workbook(file_index, file_path, submissions):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path)
+    rejected, row_edits = {}, {}
+    for submission_index, (edits, id, time) in enumerate(submissions):
+        invalid_cell_id = get_invalid_cell_id(file_index, workbook, edits)
+        if invalid_cell_id is not None:
+            rejected[submission_index] = invalid_cell_id
+            continue
+        for cell_id, edit in edits.items():
+            row_edit = row_edits.setdefault(cell_id, {})
+            if "approval" in edit:
+                row_edit.update(approval=edit["approval"], id=id, time=time)
+            if "remark" in edit:
+                row_edit["remark"] = edit["remark"]
+
+    modified = False
+    for cell_id, row_edit in row_edits.items():
+        _, sheet_index, row_number = map(int, cell_id.split("/"))
+        sheet = workbook.worksheets[sheet_index]
+        time_column, approval_column, id_column, time_column_2, remark_column = (
+            get_write_columns(file_index, sheet)
+        )
+        row = sheet[row_number]
+        if "approval" in row_edit and get_cell_text(row[approval_column]) != str(
+            row_edit["approval"]
         ):
-            task = modify_file(file_index, file_path, data, id, time)
-            modification_tasks.append(task)
-        await asyncio.gather(*modification_tasks)
-
-        month = df["name"].iloc[0].replace(" ", "%20")
-        upload_tasks = []
-        for file_index, file_path in enumerate(
-            downloaded_files[: len(downloaded_files) // 2]
+            row[time_column].value = row_edit["time"]
+            row[approval_column].value = row_edit["approval"]
+            row[id_column].value = row_edit["id"]
+            row[time_column_2].value = row_edit["time"]
+            modified = True
+        if "remark" in row_edit and get_cell_text(row[remark_column]) != str(
+            row_edit["remark"]
         ):
-            file_name = os.path.basename(file_path)
-            folder_name = patterns[file_index][0]
+            row[remark_column].value = row_edit["remark"]
+            modified = True
+
+    if modified:
+        workbook.save(file_path)
+    workbook.close()
+    return modified, rejected
+
+
+async def modify_file(file_index, file_path, submissions):
+    return await asyncio.get_event_loop().run_in_executor(
+        None, modify_workbook, file_index, file_path, submissions
+    )
+
+
+@app.get("/history")
+async def history(
+    user: str = None,
+    group: str = None,
+    reviewer: str = None,
+    month: str = None,
+    limit: int = 12,
+):
+    return await asyncio.get_event_loop().run_in_executor(
+        None, read_history, user, group, reviewer, month, limit
+    )
+
+
+@asynccontextmanager
+async def workbook_lock(file_index):
+    import fcntl
+
+    lock_path = os.path.join(tempfile.gettempdir(), f"workbook_{file_index}.lock")
+    with open(lock_path, "w") as lock_file:
+        await asyncio.get_event_loop().run_in_executor(
+            None, fcntl.flock, lock_file, fcntl.LOCK_EX
+        )
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+async def write_workbook(file_index, submissions):
+    import aiofiles
+
+    session = await get_session()
+    graph_api_headers = await get_graph_api_headers(session)
+    (month,) = await get_months(session, graph_api_headers, month_count=1)
+    folder_name, file_pattern = patterns[file_index]
+    file_name, file_item = await get_file_item(
+        session, month, folder_name, file_pattern, graph_api_headers
+    )
+    item_url = f"https://graph.microsoft.com/v1.0/drives/{os.environ['DRIVE_ID']}/items/{file_item['id']}"
+    for _ in range(write_workbook_attempts):
+        file_data = await fetch_data(
+            session,
+            f"{item_url}?select=id,eTag,@microsoft.graph.downloadUrl",
+            graph_api_headers,
+        )
+        file_path = await download_file(
+            session,
+            f"{uuid.uuid4().hex}-{file_name}",
+            file_data["@microsoft.graph.downloadUrl"],
+        )
+        try:
+            modified, rejected = await modify_file(file_index, file_path, submissions)
+            if not modified:
+                return month, 200, rejected
             async with aiofiles.open(file_path, "rb") as f:
                 file_content = await f.read()
-                upload_url = f"https://graph.microsoft.com/v1.0/drives/{drive_id}/root:/{url}/{month}/{folder_name}/Test - {file_name}:/content"
-                task = session.put(
-                    url=upload_url,
-                    headers=graph_api_headers,
-                    data=file_content,
+        finally:
+            os.remove(file_path)
+        upload_status = await upload_file(
+            session,
+            f"{item_url}/content",
+            {**graph_api_headers, "If-Match": file_data["eTag"]},
+            file_content,
+        )
+        if upload_status != 412:
+            return month, upload_status, rejected
+        logger.warning("Workbook %s changed during update, retrying", file_index)
+    return month, upload_status, rejected
+
+
+async def flush_update_queue(file_index):
+    await asyncio.sleep(update_debounce_seconds)
+    queue = update_queues.pop(file_index)
+    async with update_locks.setdefault(file_index, asyncio.Lock()), workbook_lock(
+        file_index
+    ):
+        try:
+            month, upload_status, rejected = await write_workbook(
+                file_index, queue["submissions"]
+            )
+            accepted = [
+                submission
+                for submission_index, submission in enumerate(queue["submissions"])
+                if submission_index not in rejected
+            ]
+            if upload_status == 200:
+                await asyncio.get_event_loop().run_in_executor(
+                    None, update_persisted_values, month, accepted
                 )
-                upload_tasks.append(task)
-        upload_responses = await asyncio.gather(*upload_tasks)
-        for resp in upload_responses:
-            if resp.status != 200:
-                return {"message": "Error occurred while uploading the file"}
+            for submission_index, persisted in enumerate(queue["persisted"]):
+                if submission_index in rejected:
+                    persisted.set_exception(
+                        InvalidCellIdError(rejected[submission_index])
+                    )
+                else:
+                    persisted.set_result(upload_status == 200)
+        except Exception as exc:
+            logger.exception("Failed to write workbook %s", file_index)
+            for persisted in queue["persisted"]:
+                persisted.set_exception(exc)
 
-    return {"message": "Data updated and uploaded successfully"}
+
+def enqueue_update(file_index, submission):
+    if file_index not in update_queues:
+        update_queues[file_index] = {"submissions": [], "persisted": []}
+        update_queues[file_index]["task"] = asyncio.create_task(
+            flush_update_queue(file_index)
+        )
+    persisted = asyncio.get_event_loop().create_future()
+    update_queues[file_index]["submissions"].append(submission)
+    update_queues[file_index]["persisted"].append(persisted)
+    return asyncio.shield(persisted)
+
+
+@app.post("/update")
+async def update_data(request: Request, data: dict):
+    id = data["data"]["userInfo"].split("@")[0].replace(".", " ").title()
+    time = datetime.now().strftime("%d/%m/%Y")
+    submission_id = uuid.uuid4().hex
+    edits = [
+        (key, cell_id, value, value_index)
+        for key, values, value_index in [
+            ("approval", data["data"]["approvals"], 0),
+            ("remark", data["data"]["remarks"], 1),
+        ]
+        for cell_id, value in values.items()
+    ]
+    for _, cell_id, _, _ in edits:
+        if not re.fullmatch(r"\d+/\d+/\d+", cell_id) or not (
+            int(cell_id.split("/")[0]) < len(patterns)
+            and int(cell_id.split("/")[2]) >= 2
+        ):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "message": f"Invalid cell ID {cell_id}",
+                    "submission": submission_id,
+                },
+            )
+
+    def get_file_edits(persisted_values):
+        file_edits = {}
+        for key, cell_id, value, value_index in edits:
+            if (
+                cell_id in persisted_values
+                and persisted_values[cell_id][value_index] == str(value)
+            ):
+                continue
+            file_index = int(cell_id.split("/")[0])
+            file_edits.setdefault(file_index, {}).setdefault(cell_id, {})[key] = value
+        return file_edits
+
+    persisted_values = load_persisted_values()
+    file_edits = get_file_edits(persisted_values["values"])
+    if file_edits:
+        # Only edits left to write need the current month, a snapshot from an
+        # earlier month can't skip any of them.
+        session = await get_session()
+        (month,) = await get_months(
+            session, await get_graph_api_headers(session), month_count=1
+        )
+        if persisted_values["month"] != month:
+            file_edits = get_file_edits({})
+    file_indices = sorted(file_edits)
+    persisted = await asyncio.gather(
+        *(
+            enqueue_update(file_index, (file_edits[file_index], id, time))
+            for file_index in file_indices
+        ),
+        return_exceptions=True,
+    )
+    rejected = [
+        str(result) for result in persisted if isinstance(result, InvalidCellIdError)
+    ]
+    if rejected:
+        # Edits to other workbooks may have been saved, report which ones.
+        saved = [i for i, result in zip(file_indices, persisted) if result is True]
+        return JSONResponse(
+            status_code=207 if saved else 400,
+            content={
+                "message": f"Invalid cell ID {', '.join(rejected)}",
+                "submission": submission_id,
+                "workbooks": saved,
+            },
+        )
+    if not all(result is True for result in persisted):
+        return {
+            "message": "Error occurred while uploading the file",
+            "submission": submission_id,
+        }
+
+    return {
+        "message": "Data updated and uploaded successfully",
+        "submission": submission_id,
+        "workbooks": file_indices,
+    }
 
 
 if __name__ == "__main__":
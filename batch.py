@@ -0,0 +1,169 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from time import monotonic
+from urllib.parse import unquote
+
+from app import (
+    categorical_columns,
+    get_workbook_names,
+    merge_sheets,
+    patterns,
+    process_sheet,
+    sheet_specs,
+)
+
+
+def find_workbooks(month_path):
+    workbooks = []
+    for folder_name, file_pattern in patterns:
+        folder_path = os.path.join(month_path, unquote(folder_name))
+        file_name, item_name = get_workbook_names(
+            [
+                name
+                for name in sorted(os.listdir(folder_path))
+                if not name.startswith("~$")
+            ],
+            file_pattern,
+        )
+        if item_name is None or not os.path.exists(
+            os.path.join(folder_path, item_name)
+        ):
+            raise FileNotFoundError(
+                os.path.join(folder_path, item_name or file_pattern)
+            )
+        workbooks.append((file_name, os.path.join(folder_path, item_name)))
+    return workbooks
+
+
+def get_month_folder(month_path):
+    name = os.path.basename(os.path.normpath(month_path))
+    try:
+        created = datetime.strptime(name, "%B %Y")
+    except ValueError:
+        created = datetime.fromtimestamp(os.path.getmtime(month_path), timezone.utc)
+    return {"name": name, "createdDateTime": created.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+
+def write_output(df, output_path, output_format):
+    if output_format == "parquet":
+        df.astype(str).astype(
+            {column: "category" for column in categorical_columns}
+        ).to_parquet(output_path, index=False)
+    else:
+        df.to_json(output_path, orient="records", lines=True, date_format="iso")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the /load pipeline over local month directories laid out "
+        "like the SharePoint month folders (<month>/<folder>/<workbook>.xlsx)."
+    )
+    parser.add_argument(
+        "--pair",
+        nargs=2,
+        action="append",
+        required=True,
+        metavar=("CURRENT", "PREVIOUS"),
+        help="current and previous month directories, repeat for more months",
+    )
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--format", choices=["parquet", "ndjson"], default="parquet")
+    parser.add_argument("--reviewer", default="jamero")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="also append each PREVIOUS month to the approval history under HISTORY_PATH",
+    )
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    pairs, failed_pairs = {}, {}
+    for pair_index, (current_path, previous_path) in enumerate(args.pair):
+        try:
+            pairs[pair_index] = (
+                find_workbooks(current_path),
+                find_workbooks(previous_path),
+            )
+        except OSError as exc:
+            failed_pairs[pair_index] = f"{exc}"
+            print(f"Skipping {current_path}: {exc}", file=sys.stderr)
+    specs = [spec for spec in sheet_specs if spec[0] < len(patterns)]
+    processed_data = {pair_index: [None] * len(specs) for pair_index in pairs}
+    remaining = {pair_index: len(specs) for pair_index in pairs}
+    sheets_done, rows_done, started = 0, 0, monotonic()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(
+                process_sheet,
+                file_index,
+                current_files[file_index][1],
+                previous_files[file_index][1],
+                sheet_pattern,
+                column_indices,
+                args.reviewer,
+                remove_lastname,
+                get_month_folder(args.pair[pair_index][1]) if args.history else None,
+                current_files[file_index][0],
+            ): (pair_index, spec_index)
+            for pair_index, (current_files, previous_files) in pairs.items()
+            for spec_index, (
+                file_index,
+                sheet_pattern,
+                column_indices,
+                remove_lastname,
+            ) in enumerate(specs)
+        }
+        for future in as_completed(futures):
+            pair_index, spec_index = futures[future]
+            current_path = args.pair[pair_index][0]
+            remaining[pair_index] -= 1
+            sheets_done += 1
+            try:
+                df = future.result()
+            except Exception as exc:
+                failed_pairs.setdefault(
+                    pair_index, f"sheet {specs[spec_index][1]!r}: {exc}"
+                )
+                print(
+                    f"Failed {current_path}, sheet {specs[spec_index][1]!r}: {exc}",
+                    file=sys.stderr,
+                )
+            else:
+                processed_data[pair_index][spec_index] = df
+                rows_done += len(df)
+            elapsed = monotonic() - started
+            print(
+                f"[{sheets_done}/{len(futures)}] sheets, {rows_done} rows, "
+                f"{sheets_done / elapsed:.1f} sheets/s, {rows_done / elapsed:.0f} rows/s",
+                file=sys.stderr,
+            )
+            if remaining[pair_index] == 0 and pair_index not in failed_pairs:
+                output_path = os.path.join(
+                    args.output_dir,
+                    f"{os.path.basename(os.path.normpath(current_path))}."
+                    f"{args.format}",
+                )
+                write_output(
+                    merge_sheets(processed_data[pair_index]), output_path, args.format
+                )
+                print(f"Wrote {output_path}", file=sys.stderr)
+            if remaining[pair_index] == 0:
+                processed_data[pair_index] = None
+
+    print(
+        f"Processed {len(args.pair)} month pairs, {sheets_done} sheets and {rows_done} "
+        f"rows in {monotonic() - started:.1f}s",
+        file=sys.stderr,
+    )
+    for pair_index, error in sorted(failed_pairs.items()):
+        print(f"Failed {args.pair[pair_index][0]}: {error}", file=sys.stderr)
+    return 1 if failed_pairs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+
+import app
+from app import (
+    InvalidCellIdError,
+    categorical_columns,
+    enqueue_update,
+    merge_sheets,
+    modify_workbook,
+)
+
+
+def make_sheet(rows, sheetname):
+    df = pd.DataFrame(
+        rows,
+        columns=["ID", "Group", "Username", "Firstname", "Lastname", "Approval"],
+    )
+    df["Remark"] = ""
+    df["Filename"] = "workbook"
+    df["Sheetname"] = sheetname
+    df["LastApproval"] = ""
+    return df
+
+
+def test_merge_sheets_keeps_baseline_order_with_mixed_types():
+    sheets = [
+        [
+            ["0/0/2", 10, "u1", "zoe", "", ""],
+            ["0/0/3", "admins", "u2", "john", "", ""],
+            ["0/0/4", 2.5, "u3", "amy", "", "N"],
+        ],
+        [
+            ["1/0/2", "admins", "u4", "bob", "", ""],
+            ["1/0/3", 3, "u5", "cat", "", "Y"],
+            ["1/0/4", "", "u6", "dan", "", ""],
+        ],
+    ]
+    baseline = pd.concat(
+        [make_sheet(rows, f"sheet {i}") for i, rows in enumerate(sheets)],
+        ignore_index=True,
+    )
+    baseline.loc[
+        baseline["Firstname"].str.contains(r"\bjohn\b") & (baseline["Approval"] == ""),
+        "Approval",
+    ] = "Y"
+    baseline.sort_values(
+        by=["Approval", "Sheetname", "Group", "Firstname"], inplace=True
+    )
+
+    frames = [make_sheet(rows, f"sheet {i}") for i, rows in enumerate(sheets)]
+    for df in frames:
+        for column in categorical_columns:
+            df[column] = df[column].astype("category")
+    df = merge_sheets(frames)
+
+    assert list(df["ID"]) == list(baseline["ID"])
+    assert df.astype(object).to_dict(orient="records") == baseline.astype(
+        object
+    ).to_dict(orient="records")
+
+
+def test_modify_workbook_rejects_unknown_sheets_and_rows(tmp_path):
+    workbook = Workbook()
+    workbook.active.title = "CyberArk"
+    for row in range(3):
+        workbook.active.append([f"cell {row}"] * 11)
+    workbook.create_sheet("Notes")
+    file_path = tmp_path / "workbook.xlsx"
+    workbook.save(file_path)
+
+    modified, rejected = modify_workbook(
+        0,
+        file_path,
+        [
+            ({"0/0/2": {"approval": "Y", "remark": "ok"}}, "Amy", "01/03/2024"),
+            ({"0/0/3": {"approval": "N"}, "0/0/99": {"approval": "N"}}, "Bob", "t"),
+            ({"0/1/2": {"approval": "N"}}, "Bob", "t"),
+            ({"0/5/2": {"approval": "N"}}, "Bob", "t"),
+        ],
+    )
+
+    assert modified
+    assert rejected == {1: "0/0/99", 2: "0/1/2", 3: "0/5/2"}
+    row = load_workbook(file_path).worksheets[0][2]
+    assert [row[i].value for i in [5, 6, 9, 10, 8]] == [
+        "01/03/2024",
+        "Y",
+        "Amy",
+        "01/03/2024",
+        "ok",
+    ]
+    assert load_workbook(file_path).worksheets[0][3][6].value == "cell 2"
+
+
+def test_flush_update_queue_acknowledges_each_submission(tmp_path, monkeypatch):
+    written = []
+
+    async def write_workbook(file_index, submissions):
+        written.append((file_index, submissions))
+        return "March", 200, {1: "0/0/99"}
+
+    monkeypatch.setattr(app, "write_workbook", write_workbook)
+    monkeypatch.setattr(app, "update_debounce_seconds", 0)
+    monkeypatch.setattr(
+        app, "persisted_values_path", str(tmp_path / "persisted_values.json")
+    )
+
+    async def submit():
+        return await asyncio.gather(
+            enqueue_update(0, ({"0/0/2": {"approval": "Y"}}, "Amy", "t")),
+            enqueue_update(0, ({"0/0/99": {"approval": "N"}}, "Bob", "t")),
+            return_exceptions=True,
+        )
+
+    accepted, rejected = asyncio.run(submit())
+
+    assert len(written) == 1 and len(written[0][1]) == 2
+    assert accepted is True
+    assert isinstance(rejected, InvalidCellIdError) and str(rejected) == "0/0/99"
+    with open(app.persisted_values_path) as file:
+        persisted_values = json.load(file)
+    assert persisted_values["month"] == "March"
+    assert persisted_values["values"] == {"0/0/2": ["Y", None]}
+
+
+def test_flush_update_queue_reports_failed_uploads(tmp_path, monkeypatch):
+    async def write_workbook(file_index, submissions):
+        return "March", 500, {}
+
+    monkeypatch.setattr(app, "write_workbook", write_workbook)
+    monkeypatch.setattr(app, "update_debounce_seconds", 0)
+    monkeypatch.setattr(
+        app, "persisted_values_path", str(tmp_path / "persisted_values.json")
+    )
+
+    async def submit():
+        persisted = enqueue_update(1, ({"1/0/2": {"remark": "x"}}, "Amy", "t"))
+        await app.update_queues[1]["task"]
+        return await persisted
+
+    assert asyncio.run(submit()) is False
+    assert not (tmp_path / "persisted_values.json").exists()